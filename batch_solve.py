@@ -0,0 +1,235 @@
+"""
+A batch solver for files of Stonehenge positions.
+
+Each line of the input file is one position, either as a state key returned
+by StonehengeState.to_key(), e.g. '2|1|.1.....|@@1@@@@@@', or as a side
+length followed by the moves played from the start of the game, e.g.
+'2 A E C'. Each line of the output file is the JSON result of the input line
+at the same place:
+    {"line": n, "key": k, "score": s, "move": m}
+    {"line": n, "error": e}
+where score is the highest guaranteed score for the player to move and move
+achieves it (null if the game is over).
+
+The output is written in input order as the results come in, and a solve
+that was interrupted resumes after the last line of its output. At most a
+few positions per worker are held in memory at once, whatever the size of
+the input file.
+
+Usage:
+    python batch_solve.py INPUT OUTPUT [options]
+"""
+from typing import Any, Iterator, Tuple, Union
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+from endgame import EndgameTable
+from game_state import GameState
+from stonehenge import Stonehenge, StonehengeState
+from strategy import cached_state_value
+from transposition import TranspositionTable
+
+# positions queued per worker, ahead of the one it is solving
+QUEUED_PER_WORKER = 4
+
+# the caches of a worker process, set up by _init_worker
+_endgame = None
+_table = None
+_games = {}
+
+
+def parse_position(line: str, p1_starts: bool = True) -> StonehengeState:
+    """
+    Return the StonehengeState described by line, where p1 moves first iff
+    p1_starts for a line of moves. Raise a ValueError if line describes no
+    position.
+
+    >>> parse_position('1 A').to_key()
+    '1|2|1..|1@@1@1'
+    >>> parse_position('1|2|1..|1@@1@1').to_key()
+    '1|2|1..|1@@1@1'
+    >>> parse_position('7 A')
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid side length 7
+    """
+
+    line = line.strip()
+    if '|' in line:
+        return StonehengeState.from_key(line)
+    words = line.split()
+    if not words:
+        raise ValueError('empty line')
+    return StonehengeState.from_moves(int(words[0]), words[1:], p1_starts)
+
+
+def solve_position(game: Stonehenge, state: StonehengeState,
+                   table: TranspositionTable,
+                   endgame: EndgameTable = None) -> Tuple[int, Any]:
+    """
+    Return the highest guaranteed score for the current player of state and
+    a move that achieves it, or None for the move if game is over at state.
+    game.current_state is left unchanged.
+
+    >>> game = Stonehenge(True, 1)
+    >>> solve_position(game, StonehengeState(True, 1), TranspositionTable(1))
+    (1, 'A')
+    """
+
+    moves = state.get_possible_moves()
+    if not moves:
+        return cached_state_value(game, state, table, None, None,
+                                  endgame), None
+    best_score, best_move = GameState.LOSE - 1, None
+    for move in moves:
+        # multiply by -1 because of the game's zero-sum rule.
+        score = -1 * cached_state_value(game, state.make_move(move), table,
+                                        None, None, endgame)
+        if score > best_score:
+            best_score, best_move = score, move
+        # nothing beats a win, so the other moves need not be searched
+        if best_score == GameState.WIN:
+            break
+    return best_score, best_move
+
+
+def _load_endgame(endgame_path: Union[str, None],
+                  max_cells: int) -> Union[EndgameTable, None]:
+    """
+    Return the endgame table of positions of at most max_cells unclaimed
+    cells saved at endgame_path, or None if endgame_path is None. The table
+    builds no more positions, so that it stays shared by the workers and
+    their memory stays bounded.
+    """
+
+    if endgame_path is None:
+        return None
+    endgame = EndgameTable(max_cells, 0)
+    endgame.load(endgame_path)
+    return endgame
+
+
+def _init_worker(endgame_path: Union[str, None], max_cells: int,
+                 size_mb: float) -> None:
+    """
+    Set up the caches of a worker process: a transposition table of
+    size_mb megabytes of its own, and the endgame table saved at
+    endgame_path, if any, shared with the other workers.
+    """
+
+    global _endgame, _table
+    # a forked worker already has the table its parent loaded, and shares
+    # its pages with the parent as long as it only reads them
+    if _endgame is None:
+        _endgame = _load_endgame(endgame_path, max_cells)
+    _table = TranspositionTable(size_mb)
+
+
+def _solve_line(number: int, line: str, p1_starts: bool) -> str:
+    """
+    Return the JSON result of line number of the input file.
+    """
+
+    try:
+        state = parse_position(line, p1_starts)
+    except ValueError as error:
+        return json.dumps({'line': number, 'error': str(error)})
+    # any game with the right board works, as it is only asked who won
+    if state.side_length not in _games:
+        _games[state.side_length] = Stonehenge(True, state.side_length)
+    score, move = solve_position(_games[state.side_length], state, _table,
+                                 _endgame)
+    return json.dumps({'line': number, 'key': state.to_key(),
+                       'score': score, 'move': move})
+
+
+def count_results(output_path: str) -> int:
+    """
+    Return the number of complete results in the file at output_path,
+    cutting off an unfinished last line left by a crash.
+    """
+
+    if not os.path.exists(output_path):
+        return 0
+    count = 0
+    complete = 0  # the length of the complete lines, in bytes
+    with open(output_path, 'rb') as output:
+        for line in output:
+            if not line.endswith(b'\n'):
+                break
+            count += 1
+            complete += len(line)
+    with open(output_path, 'r+b') as output:
+        output.truncate(complete)
+    return count
+
+
+def _numbered_lines(input_path: str, skip: int) -> Iterator[Tuple[int, str]]:
+    """
+    Yield each line of the file at input_path after the first skip ones,
+    with its line number.
+    """
+
+    with open(input_path) as input_file:
+        for number, line in enumerate(input_file, 1):
+            if number > skip:
+                yield number, line
+
+
+def batch_solve(input_path: str, output_path: str, num_workers: int = 0,
+                p1_starts: bool = True, endgame_path: str = None,
+                max_cells: int = 7, size_mb: float = 64) -> int:
+    """
+    Solve every position of the file at input_path with num_workers worker
+    processes, appending their results to the file at output_path after
+    the ones already there. Return the number of positions solved.
+
+    The workers probe the endgame table saved at endgame_path, if given,
+    for positions of at most max_cells unclaimed cells, and each keeps a
+    transposition table of size_mb megabytes between its positions.
+    """
+
+    global _endgame
+    num_workers = num_workers or multiprocessing.cpu_count()
+    skip = count_results(output_path)
+    # load the endgame table before forking, so the workers share it
+    _endgame = _load_endgame(endgame_path, max_cells)
+
+    solved = 0
+    pending = collections.deque()
+    with multiprocessing.Pool(num_workers, _init_worker,
+                              (endgame_path, max_cells, size_mb)) as pool, \
+            open(output_path, 'a') as output:
+        for number, line in _numbered_lines(input_path, skip):
+            pending.append(pool.apply_async(_solve_line,
+                                            (number, line, p1_starts)))
+            # wait for the oldest position rather than read more of the file
+            while len(pending) > QUEUED_PER_WORKER * num_workers:
+                output.write(pending.popleft().get() + '\n')
+                output.flush()
+                solved += 1
+        while pending:
+            output.write(pending.popleft().get() + '\n')
+            output.flush()
+            solved += 1
+    return solved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--p2-starts', action='store_true')
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('--endgame', help='an endgame table saved by '
+                                          'EndgameTable.save')
+    parser.add_argument('--max-cells', type=int, default=7)
+    parser.add_argument('--size-mb', type=float, default=64)
+    arguments = parser.parse_args()
+
+    print(batch_solve(arguments.input, arguments.output, arguments.workers,
+                      not arguments.p2_starts, arguments.endgame,
+                      arguments.max_cells, arguments.size_mb))
@@ -0,0 +1,196 @@
+"""
+A batching layer that shares strategy searches between games that reach the
+same position at the same time.
+"""
+from typing import Any, Callable, Dict, Tuple
+import collections
+import threading
+import time
+from game import Game
+from strategy import state_key
+
+
+class ResultCache:
+    """
+    A cache of moves by position key, holding at most max_entries moves and
+    dropping the least recently used one first. Moves expire after ttl
+    seconds.
+
+    === Attributes ===
+    max_entries - the most moves kept at once
+    ttl - the seconds a move stays valid after it was stored
+    """
+    max_entries: int
+    ttl: float
+    _entries: 'collections.OrderedDict[Any, Tuple[float, Any]]'
+    _lock: threading.Lock
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0) -> None:
+        """
+        Initialize an empty ResultCache.
+
+        >>> cache = ResultCache(2)
+        >>> cache.put('a', 'A')
+        >>> cache.put('b', 'B')
+        >>> cache.lookup('a')
+        (True, 'A')
+        >>> cache.put('c', 'C')
+        >>> cache.lookup('b')
+        (False, None)
+        """
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Any) -> Tuple[bool, Any]:
+        """
+        Return (True, move) if a move that has not expired is cached for key,
+        and (False, None) otherwise.
+        """
+
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            stored_at, move = self._entries[key]
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, move
+
+    def put(self, key: Any, move: Any) -> None:
+        """
+        Cache move for key, dropping the least recently used move if this
+        ResultCache is full.
+        """
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), move)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _Search:
+    """
+    A search for the move of one position, shared by every game waiting for
+    it.
+    """
+    game: Game
+    done: threading.Event
+    move: Any
+    error: Exception
+
+    def __init__(self, game: Game) -> None:
+        """
+        Initialize a search of game.current_state.
+        """
+
+        self.game = game
+        self.done = threading.Event()
+        self.move = None
+        self.error = None
+
+
+class MoveBatcher:
+    """
+    Serves move requests from many concurrent games with one strategy.
+    Requests arriving within window seconds of each other are grouped by
+    position, the strategy is called once per distinct position and its move
+    is returned to every game waiting for it. Moves are also kept in a
+    ResultCache for later requests.
+
+    The strategy is only ever called by one search at a time, since
+    strategies that keep state between calls (e.g. PonderingStrategy or
+    TimedStrategy) are not thread-safe.
+
+    === Attributes ===
+    strategy - the strategy searching the positions
+    window - the seconds requests are collected before they are searched
+    cache - the moves found so far, by position key
+    requests - the number of moves requested so far
+    searches - the number of times strategy was called so far
+    """
+    strategy: Callable[[Game], Any]
+    window: float
+    cache: ResultCache
+    requests: int
+    searches: int
+    _batch: Dict[str, _Search]
+    _running: Dict[str, _Search]
+    _lock: threading.Lock
+    _strategy_lock: threading.Lock
+
+    def __init__(self, strategy: Callable[[Game], Any], window: float = 0.01,
+                 max_entries: int = 10000, ttl: float = 60.0) -> None:
+        """
+        Initialize a MoveBatcher for strategy, caching at most max_entries
+        moves for ttl seconds.
+        """
+
+        self.strategy = strategy
+        self.window = window
+        self.cache = ResultCache(max_entries, ttl)
+        self.requests = 0
+        self.searches = 0
+        self._batch = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._strategy_lock = threading.Lock()
+
+    def request_move(self, game: Game) -> Any:
+        """
+        Return the move of self.strategy for game, waiting for the search of
+        its position to finish.
+        """
+
+        key = state_key(game.current_state)
+        with self._lock:
+            self.requests += 1
+            found, move = self.cache.lookup(key)
+            if found:
+                return move
+            # join a search of the same position if there is one
+            search = self._running.get(key, self._batch.get(key))
+            if search is None:
+                search = _Search(game)
+                if not self._batch:
+                    threading.Timer(self.window, self._flush).start()
+                self._batch[key] = search
+
+        search.done.wait()
+        if search.error is not None:
+            raise search.error
+        return search.move
+
+    def _flush(self) -> None:
+        """
+        Search every position of the current batch, each in its own thread.
+        The threads take turns calling the strategy.
+        """
+
+        with self._lock:
+            batch = self._batch
+            self._batch = {}
+            self._running.update(batch)
+        for key in batch:
+            threading.Thread(target=self._search, args=(key, batch[key]),
+                             daemon=True).start()
+
+    def _search(self, key: str, search: _Search) -> None:
+        """
+        Find the move for search and hand it to the games waiting for it.
+        """
+
+        try:
+            with self._strategy_lock:
+                search.move = self.strategy(search.game)
+            self.cache.put(key, search.move)
+        except Exception as error:  # the waiting games get the error
+            search.error = error
+        with self._lock:
+            self.searches += 1
+            del self._running[key]
+        search.done.set()
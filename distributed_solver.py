@@ -0,0 +1,429 @@
+"""
+A checkpointed, resumable Stonehenge solver that spreads its work over
+worker processes, on this host or on others.
+
+Workers talk to the coordinator over TCP, one JSON message per line:
+    worker -> coordinator: {"type": "request"}
+                           {"type": "result", "moves": [...], "score": s}
+    coordinator -> worker: {"type": "unit", "side_length": n,
+                            "p1_starts": b, "moves": [...]}
+                           {"type": "wait"}
+                           {"type": "done"}
+
+Usage:
+    python distributed_solver.py solve SIDE_LENGTH CHECKPOINT [options]
+    python distributed_solver.py worker HOST PORT
+"""
+from typing import Any, Dict, List, Tuple, Union
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+from game_state import GameState
+from stonehenge import Stonehenge, StonehengeState
+from strategy import cached_state_value
+from transposition import TranspositionTable
+
+# seconds an idle worker waits before asking for work again
+WAIT_SECONDS = 0.1
+
+
+def work_units(state: StonehengeState, depth: int) -> List[List[str]]:
+    """
+    Return the move sequences of at most depth moves that split the game
+    tree below state into independent units of work. A sequence is shorter
+    than depth only if the game is over after it.
+
+    >>> len(work_units(StonehengeState(True, 2), 2))
+    42
+    >>> work_units(StonehengeState(True, 1), 2)
+    [['A'], ['B'], ['C']]
+    """
+
+    if depth == 0 or not state.get_possible_moves():
+        return [[]]
+    units = []
+    for move in state.get_possible_moves():
+        for unit in work_units(state.make_move(move), depth - 1):
+            units.append([move] + unit)
+    return units
+
+
+def _complete_lines(path: str) -> List[str]:
+    """
+    Return the complete lines of the file at path, or [] if there is no
+    such file. An unfinished last line left by a crash is cut off the file,
+    so that the next line appended to it starts on a line of its own.
+    """
+
+    if not os.path.exists(path):
+        return []
+    lines = []
+    complete = 0  # the length of the complete lines, in bytes
+    with open(path, 'rb') as checkpoint:
+        for line in checkpoint:
+            if not line.endswith(b'\n'):
+                break
+            lines.append(line.decode())
+            complete += len(line)
+    with open(path, 'r+b') as checkpoint:
+        checkpoint.truncate(complete)
+    return lines
+
+
+def solve_unit(game: Stonehenge, moves: List[str],
+               table: TranspositionTable) -> int:
+    """
+    Return the highest guaranteed score for the current player of the state
+    reached by playing moves from the start of game.
+    """
+
+    state = StonehengeState.from_moves(game.current_state.side_length, moves,
+                                       game.p1_starts)
+    return cached_state_value(game, state, table)
+
+
+class SolverCoordinator:
+    """
+    Hands out the work units of a solve to workers, records their results
+    in a checkpoint file and combines them into the score of the initial
+    state. Units already in the checkpoint file are not solved again, so an
+    interrupted solve can be resumed. When no unit is left to hand out, the
+    unit running for the longest on another worker is split into one unit
+    per move from its state, which idle workers take over. A unit is done
+    once it has a result or all the units it was split into are done.
+
+    The first line of the checkpoint file records the board and unit depth
+    of the solve, so that it is never resumed with different ones.
+
+    === Attributes ===
+    side_length - the side length of the board being solved
+    p1_starts - whether player one moves first
+    checkpoint_path - the file the results are appended to
+    results - the score of each finished unit, by its moves joined in a str
+    """
+    side_length: int
+    p1_starts: bool
+    checkpoint_path: str
+    results: Dict[str, int]
+    _pending: List[List[str]]
+    _running: Dict[str, Tuple[List[str], int]]
+    _split: Dict[str, List[List[str]]]
+    _lock: threading.Lock
+
+    def __init__(self, side_length: int, p1_starts: bool, depth: int,
+                 checkpoint_path: str) -> None:
+        """
+        Initialize a SolverCoordinator for the board of side_length, split
+        into units of depth moves, resuming from checkpoint_path if it
+        exists. Raise a ValueError if checkpoint_path holds the checkpoint
+        of a different solve.
+        """
+
+        self.side_length = side_length
+        self.p1_starts = p1_starts
+        self.checkpoint_path = checkpoint_path
+        self.results = {}
+        self._running = {}
+        self._split = {}
+        self._lock = threading.Lock()
+
+        header = {'side_length': side_length, 'p1_starts': p1_starts,
+                  'depth': depth}
+        lines = _complete_lines(checkpoint_path)
+        if not lines:
+            self._append(header)
+        elif json.loads(lines[0]) != header:
+            raise ValueError('{} is the checkpoint of another solve: {}'
+                             .format(checkpoint_path, lines[0].strip()))
+        for line in lines[1:]:
+            record = json.loads(line)
+            self.results[''.join(record['moves'])] = record['score']
+
+        initial_state = StonehengeState(p1_starts, side_length)
+        self._pending = [unit for unit in work_units(initial_state, depth)
+                         if ''.join(unit) not in self.results]
+
+    def is_done(self) -> bool:
+        """
+        Return whether every unit of this solve has a result.
+        """
+
+        with self._lock:
+            return (all(self._is_solved(unit) for unit in self._pending)
+                    and all(self._is_solved(unit)
+                            for unit, _ in self._running.values()))
+
+    def next_unit(self, worker: int) -> Union[List[str], None]:
+        """
+        Return the moves of the next unit for worker to solve, or None if
+        there is nothing for it to do right now.
+        """
+
+        with self._lock:
+            while self._pending:
+                unit = self._pending.pop()
+                if not self._is_solved(unit):
+                    self._running[''.join(unit)] = (unit, worker)
+                    return unit
+            # split the unit running for the longest on another worker
+            for key, (unit, owner) in list(self._running.items()):
+                if (owner == worker or key in self._split
+                        or self._is_solved(unit)):
+                    continue
+                state = StonehengeState.from_moves(self.side_length, unit,
+                                                   self.p1_starts)
+                children = [unit + [move]
+                            for move in state.get_possible_moves()]
+                if children:
+                    self._split[key] = children
+                    self._pending.extend(reversed(children))
+                    unit = self._pending.pop()
+                    self._running[''.join(unit)] = (unit, worker)
+                    return unit
+            return None
+
+    def record(self, moves: List[str], score: int) -> None:
+        """
+        Record score as the result of the unit of moves, in memory and in
+        the checkpoint file. Raise a ValueError if no such unit was handed
+        out or if score is not a score of the game.
+        """
+
+        key = ''.join(moves)
+        with self._lock:
+            if key not in self._running and key not in self.results:
+                raise ValueError('no unit {} was handed out'.format(moves))
+            if type(score) is not int or score not in (GameState.WIN,
+                                                       GameState.LOSE,
+                                                       GameState.DRAW):
+                raise ValueError('invalid score {!r}'.format(score))
+            self._running.pop(key, None)
+            if key in self.results:  # a split unit finished twice
+                return
+            self.results[key] = score
+            self._append({'moves': moves, 'score': score})
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """
+        Append record to the checkpoint file, on disk before returning.
+        """
+
+        with open(self.checkpoint_path, 'a') as checkpoint:
+            checkpoint.write(json.dumps(record) + '\n')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+    def release(self, worker: int) -> None:
+        """
+        Put the units worker was solving back in the pending units, e.g.
+        after losing its connection.
+        """
+
+        with self._lock:
+            for key in list(self._running):
+                unit, owner = self._running[key]
+                if owner == worker:
+                    del self._running[key]
+                    # the units it was split into are handed out already
+                    if key not in self._split:
+                        self._pending.append(unit)
+
+    def score(self) -> Tuple[int, Any]:
+        """
+        Return the highest guaranteed score for the player to move first and
+        a move that achieves it, from the results of the units.
+
+        Precondition: self.is_done()
+        """
+
+        return self._back_up(StonehengeState(self.p1_starts,
+                                             self.side_length), [])
+
+    def solve(self, num_workers: int = 0, host: str = '127.0.0.1',
+              port: int = 0) -> Tuple[int, Any]:
+        """
+        Serve work units on host and port, start num_workers local worker
+        processes and return self.score() once every unit is solved.
+        Remote workers can connect with run_worker at any time.
+        """
+
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            """
+            Serves the messages of one connected worker.
+            """
+
+            def handle(self) -> None:
+                """
+                Answer the requests and results of the worker.
+                """
+
+                worker = id(self)
+                try:
+                    for line in self.rfile:
+                        message = _check_message(json.loads(line))
+                        if message['type'] == 'result':
+                            coordinator.record(message['moves'],
+                                               message['score'])
+                        self.wfile.write(
+                            coordinator.reply(worker).encode() + b'\n')
+                except (OSError, ValueError):
+                    pass
+                finally:
+                    coordinator.release(worker)
+
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        address = server.server_address
+
+        workers = [multiprocessing.Process(target=run_worker, args=address,
+                                           daemon=True)
+                   for _ in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        while not self.is_done():
+            time.sleep(WAIT_SECONDS)
+        server.shutdown()
+        server.server_close()
+        # workers may still be solving stolen units that are already done
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        return self.score()
+
+    def reply(self, worker: int) -> str:
+        """
+        Return the message telling worker what to do next.
+        """
+
+        if self.is_done():
+            return json.dumps({'type': 'done'})
+        unit = self.next_unit(worker)
+        if unit is None:
+            return json.dumps({'type': 'wait'})
+        return json.dumps({'type': 'unit', 'side_length': self.side_length,
+                           'p1_starts': self.p1_starts, 'moves': unit})
+
+    def _is_solved(self, unit: List[str]) -> bool:
+        """
+        Return whether unit, or a unit it is part of, has a result, or
+        whether all the units it was split into are solved.
+        """
+
+        for i in range(len(unit) + 1):
+            if ''.join(unit[:i]) in self.results:
+                return True
+        key = ''.join(unit)
+        return key in self._split and all(self._is_solved(child)
+                                          for child in self._split[key])
+
+    def _back_up(self, state: StonehengeState,
+                 moves: List[str]) -> Tuple[int, Any]:
+        """
+        Return the highest guaranteed score for the current player of state,
+        reached by moves, and a move that achieves it.
+        """
+
+        key = ''.join(moves)
+        if key in self.results:
+            return self.results[key], None
+        best_score, best_move = None, None
+        for move in state.get_possible_moves():
+            # multiply by -1 because of the game's zero-sum rule.
+            score = -1 * self._back_up(state.make_move(move),
+                                       moves + [move])[0]
+            if best_score is None or score > best_score:
+                best_score, best_move = score, move
+        return best_score, best_move
+
+
+def _check_message(message: Any) -> Dict[str, Any]:
+    """
+    Return message, a message from a worker, or raise a ValueError if it is
+    not a request or a result.
+
+    >>> _check_message({'type': 'result', 'moves': ['A'], 'score': 1})
+    {'type': 'result', 'moves': ['A'], 'score': 1}
+    >>> _check_message({'type': 'result', 'moves': ['A']})
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid message {'type': 'result', 'moves': ['A']}
+    """
+
+    if not isinstance(message, dict) or message.get('type') not in (
+            'request', 'result'):
+        raise ValueError('invalid message {!r}'.format(message))
+    if message['type'] == 'result':
+        moves = message.get('moves')
+        if (not isinstance(moves, list) or 'score' not in message
+                or not all(isinstance(move, str) for move in moves)):
+            raise ValueError('invalid message {!r}'.format(message))
+    return message
+
+
+def run_worker(host: str, port: int, size_mb: float = 64) -> None:
+    """
+    Solve the units handed out by the coordinator at host and port until it
+    has no more work, keeping a transposition table of size_mb megabytes
+    between units.
+    """
+
+    table = TranspositionTable(size_mb)
+    games = {}  # one game per board, reused between units
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile('rwb')
+        message = {'type': 'request'}
+        while True:
+            stream.write(json.dumps(message).encode() + b'\n')
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                return
+            reply = json.loads(line)
+            if reply['type'] == 'done':
+                return
+            if reply['type'] == 'wait':
+                time.sleep(WAIT_SECONDS)
+                message = {'type': 'request'}
+                continue
+            board = (reply['side_length'], reply['p1_starts'])
+            if board not in games:
+                games[board] = Stonehenge(reply['p1_starts'],
+                                          reply['side_length'])
+            score = solve_unit(games[board], reply['moves'], table)
+            message = {'type': 'result', 'moves': reply['moves'],
+                       'score': score}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    solve_parser = commands.add_parser('solve')
+    solve_parser.add_argument('side_length', type=int)
+    solve_parser.add_argument('checkpoint')
+    solve_parser.add_argument('--p2-starts', action='store_true')
+    solve_parser.add_argument('--depth', type=int, default=2)
+    solve_parser.add_argument('--workers', type=int,
+                              default=multiprocessing.cpu_count())
+    solve_parser.add_argument('--host', default='127.0.0.1')
+    solve_parser.add_argument('--port', type=int, default=0)
+    worker_parser = commands.add_parser('worker')
+    worker_parser.add_argument('host')
+    worker_parser.add_argument('port', type=int)
+    worker_parser.add_argument('--size-mb', type=float, default=64)
+    arguments = parser.parse_args()
+
+    if arguments.command == 'solve':
+        solver = SolverCoordinator(arguments.side_length,
+                                   not arguments.p2_starts, arguments.depth,
+                                   arguments.checkpoint)
+        print(solver.solve(arguments.workers, arguments.host, arguments.port))
+    else:
+        run_worker(arguments.host, arguments.port, arguments.size_mb)
@@ -0,0 +1,272 @@
+"""
+An endgame table of exact Stonehenge scores for positions with few
+unclaimed cells.
+
+A position is reduced to what still matters for its result: how many
+ley-lines each player still needs, and for each ley-line nobody has captured
+yet, how many more cells each player needs on it and which unclaimed cells
+it holds. Cells on no open ley-line are dead and only counted. Everything is
+seen from the current player ("me") and cells are relabelled, so positions
+of different boards, move orders and colours share entries.
+"""
+from typing import Any, Dict, List, Tuple, Union
+import json
+from game_state import GameState
+from stonehenge import StonehengeState
+
+# (cells I need, cells the opponent needs, unclaimed cells) of an open line
+Line = Tuple[int, int, Tuple[int, ...]]
+# (ley-lines I need, ley-lines the opponent needs, open lines, dead cells)
+Position = Tuple[int, int, Tuple[Line, ...], int]
+
+
+def _canonical(need_me: int, need_opp: int, lines: List[Line],
+               dead: int) -> Position:
+    """
+    Return the Position with need_me, need_opp, lines and dead, with its
+    cells relabelled in order of appearance in its sorted lines.
+
+    >>> _canonical(2, 3, [(1, 2, (7, 4)), (1, 1, (4,))], 0)
+    (2, 3, ((1, 1, (0,)), (1, 2, (0, 1))), 0)
+    """
+
+    lines = sorted(lines, key=lambda line: (line[0], line[1], len(line[2]),
+                                            sorted(line[2])))
+    labels = {}
+    for line in lines:
+        for cell in sorted(line[2]):
+            labels.setdefault(cell, len(labels))
+    relabelled = sorted((r_me, r_opp, tuple(sorted(labels[cell]
+                                                   for cell in cells)))
+                        for r_me, r_opp, cells in lines)
+    return need_me, need_opp, tuple(relabelled), dead
+
+
+def _cells(position: Position) -> List[int]:
+    """
+    Return the live cells of position, i.e. those on an open line.
+    """
+
+    return sorted(set(cell for line in position[2] for cell in line[2]))
+
+
+def _children(position: Position) -> List[Union[Position, None]]:
+    """
+    Return the Position reached by each move from position, seen from the
+    opponent, or None for a move that wins the game.
+    """
+
+    need_me, need_opp, lines, dead = position
+    cells = _cells(position)
+    children = []
+    for cell in cells:
+        new_need = need_me
+        new_lines = []
+        for r_me, r_opp, line_cells in lines:
+            if cell not in line_cells:
+                new_lines.append((r_opp, r_me, line_cells))
+            elif r_me == 1:
+                new_need -= 1  # I capture this ley-line
+            else:
+                new_lines.append((r_opp, r_me - 1,
+                                  tuple(other for other in line_cells
+                                        if other != cell)))
+        if new_need <= 0:
+            children.append(None)
+        else:
+            # cells left on no open line have become dead
+            live = set(other for line in new_lines for other in line[2])
+            new_dead = dead + len(cells) - 1 - len(live)
+            children.append(_canonical(need_opp, new_need, new_lines,
+                                       new_dead))
+    # claiming a dead cell only passes the turn
+    if dead > 0:
+        children.append(_canonical(need_opp, need_me,
+                                   [(r_opp, r_me, line_cells)
+                                    for r_me, r_opp, line_cells in lines],
+                                   dead - 1))
+    return children
+
+
+def _position_from_json(data: Any) -> Position:
+    """
+    Return the Position read back from data, a Position saved as JSON, which
+    has lists in place of tuples. Raise a ValueError if data is not a
+    Position.
+
+    >>> _position_from_json([1, 2, [[1, 1, [0, 1]]], 0])
+    (1, 2, ((1, 1, (0, 1)),), 0)
+    """
+
+    try:
+        need_me, need_opp, lines, dead = data
+        return (int(need_me), int(need_opp),
+                tuple((int(r_me), int(r_opp),
+                       tuple(int(cell) for cell in cells))
+                      for r_me, r_opp, cells in lines), int(dead))
+    except (TypeError, ValueError):
+        raise ValueError('not a position: {!r}'.format(data))
+
+
+def position_of(state: StonehengeState) -> Union[Position, None]:
+    """
+    Return the Position of state, or None if the game is over at state.
+
+    >>> position_of(StonehengeState(True, 1))
+    (3, 3, ((1, 1, (0,)), (1, 1, (0, 1)), (1, 1, (0, 2)), (1, 1, (1,)), \
+(1, 1, (1, 2)), (1, 1, (2,))), 0)
+    """
+
+    if state.p1_turn:
+        me, opp = 1, 2
+    else:
+        me, opp = 2, 1
+    unclaimed = set()
+    for ley_line in state.gameboard:
+        for cell in state.gameboard[ley_line]:
+            if not str(cell).isdigit():
+                unclaimed.add(cell)
+    labels = {cell: i for i, cell in enumerate(sorted(unclaimed))}
+
+    claimed = {1: 0, 2: 0}
+    lines = []
+    for ley_line in state.gameboard:
+        owner = state.ley_lines[ley_line]
+        if owner == 1 or owner == 2:
+            claimed[owner] += 1
+            continue
+        cells = state.gameboard[ley_line]
+        # a ley-line is captured with at least half of its cells
+        half = (len(cells) + 1) // 2
+        lines.append((half - cells.count(me), half - cells.count(opp),
+                      tuple(labels[cell] for cell in cells
+                            if cell in labels)))
+
+    # a player wins with at least half of the ley-lines
+    half_lines = (len(state.ley_lines) + 1) // 2
+    need_me = half_lines - claimed[me]
+    need_opp = half_lines - claimed[opp]
+    if need_me <= 0 or need_opp <= 0:
+        return None
+    live = set(cell for line in lines for cell in line[2])
+    return _canonical(need_me, need_opp, lines, len(unclaimed) - len(live))
+
+
+class EndgameTable:
+    """
+    Exact scores of endgame Positions for the player to move. The first
+    probe of a position builds, backwards from the end of the game, the
+    score of every position reachable from it, so later probes of any of
+    them are a single lookup.
+
+    Building a position of n unclaimed cells scores up to 3 ** n positions,
+    so tables for more than about 7 cells are best built once, saved and
+    loaded by the searches. Once the table holds max_entries positions,
+    nothing more is built and it only answers for the positions it has.
+
+    === Attributes ===
+    max_cells - the most unclaimed cells of a position that is probed
+    max_entries - the number of positions after which nothing more is built
+    scores - the score of each Position built so far
+    """
+    max_cells: int
+    max_entries: int
+    scores: Dict[Position, int]
+
+    def __init__(self, max_cells: int = 7,
+                 max_entries: int = 1000000) -> None:
+        """
+        Initialize an empty EndgameTable for positions of at most max_cells
+        unclaimed cells, building at most about max_entries positions.
+        """
+
+        self.max_cells = max_cells
+        self.max_entries = max_entries
+        self.scores = {}
+
+    def probe(self, state: GameState) -> Union[int, None]:
+        """
+        Return the highest guaranteed score for the current player of state,
+        or None if state is not an endgame this table covers.
+
+        >>> table = EndgameTable()
+        >>> table.probe(StonehengeState(True, 2))
+        1
+        >>> EndgameTable(max_entries=0).probe(StonehengeState(True, 2))
+        """
+
+        if (not isinstance(state, StonehengeState)
+                or len(state.get_possible_moves()) > self.max_cells):
+            return None
+        position = position_of(state)
+        if position is None:
+            return None
+        if position not in self.scores:
+            # a full table only answers for the positions it has
+            if len(self.scores) >= self.max_entries:
+                return None
+            self.build(position)
+        return self.scores[position]
+
+    def build(self, root: Position) -> None:
+        """
+        Record the score of root and of every position reachable from it.
+        """
+
+        # find the positions to score, by their number of unclaimed cells
+        levels = {}
+        children_of = {root: _children(root)}
+        stack = [root]
+        while stack:
+            position = stack.pop()
+            empty = len(_cells(position)) + position[3]
+            levels.setdefault(empty, []).append(position)
+            for child in children_of[position]:
+                if (child is not None and child not in children_of
+                        and child not in self.scores):
+                    children_of[child] = _children(child)
+                    stack.append(child)
+
+        # score them backwards, from the end of the game, so the children
+        # of a position are always scored before it
+        for empty in sorted(levels):
+            for position in levels[empty]:
+                children = children_of[position]
+                if not children:
+                    score = GameState.DRAW
+                elif None in children:
+                    score = GameState.WIN
+                else:
+                    # multiply by -1 because of the game's zero-sum rule.
+                    score = max(-1 * self.scores[child]
+                                for child in children)
+                self.scores[position] = score
+
+    def save(self, path: str) -> None:
+        """
+        Write the scores of this EndgameTable to the file at path, as a JSON
+        list of [position, score] pairs.
+        """
+
+        with open(path, 'w') as table_file:
+            json.dump([[position, score]
+                       for position, score in self.scores.items()],
+                      table_file, separators=(',', ':'))
+
+    def load(self, path: str) -> None:
+        """
+        Add the scores saved in the file at path to this EndgameTable. The
+        file only holds data, so loading it cannot run any code. Raise a
+        ValueError if it does not hold saved scores.
+        """
+
+        with open(path) as table_file:
+            pairs = json.load(table_file)
+        if not isinstance(pairs, list):
+            raise ValueError('{} holds no endgame table'.format(path))
+        for pair in pairs:
+            if (not isinstance(pair, list) or len(pair) != 2
+                    or pair[1] not in (GameState.WIN, GameState.LOSE,
+                                       GameState.DRAW)):
+                raise ValueError('{} holds no endgame table'.format(path))
+            self.scores[_position_from_json(pair[0])] = pair[1]
@@ -38,6 +38,14 @@ class GameState:
         """
         raise NotImplementedError
 
+    def get_search_moves(self) -> list:
+        """
+        Return the moves a search has to try from this state to find its
+        score. Unless a subclass knows some moves to be equivalent, these are
+        all the possible moves.
+        """
+        return self.get_possible_moves()
+
     def get_current_player_name(self) -> str:
         """
         Return 'p1' if the current player is Player 1, and 'p2' if the current
@@ -66,6 +74,14 @@ class GameState:
         """
         raise NotImplementedError
 
+    def to_key(self) -> str:
+        """
+        Return a str identifying this state, for use as a key in caches of
+        searched states. Subclasses may return something more compact than
+        the representation.
+        """
+        return repr(self)
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
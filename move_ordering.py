@@ -0,0 +1,73 @@
+"""
+History and killer move heuristics for ordering the moves of a search.
+"""
+from typing import Any, Dict, List
+
+
+class MoveOrdering:
+    """
+    Learns which moves cause cutoffs, to try them first in later searches.
+
+    A move's history score grows every time it cuts a search off, more so
+    the deeper the search. The killer moves of a ply are the last two moves
+    that caused a cutoff at that ply. The searches tell the ply of a state
+    by its number of moves rather than by its distance from the root, so
+    that plies line up between the searches of successive turns of a game.
+
+    === Attributes ===
+    history - the history score of each move
+    killers - the killer moves of each ply, most recent first
+    """
+    history: Dict[Any, int]
+    killers: Dict[int, List[Any]]
+
+    def __init__(self) -> None:
+        """
+        Initialize a MoveOrdering that has learnt nothing yet.
+        """
+
+        self.history = {}
+        self.killers = {}
+
+    def order(self, moves: List[Any], ply: int) -> List[Any]:
+        """
+        Return moves with the killer moves of ply first, then the others by
+        decreasing history score. Moves that tie keep their order.
+
+        >>> ordering = MoveOrdering()
+        >>> ordering.record_cutoff('C', 5, 2)
+        >>> ordering.record_cutoff('B', 4, 1)
+        >>> ordering.order(['A', 'B', 'C', 'D'], 4)
+        ['B', 'C', 'A', 'D']
+        """
+
+        killers = self.killers.get(ply, [])
+        return sorted(moves, key=lambda move: (move not in killers,
+                                               -self.history.get(move, 0)))
+
+    def record_cutoff(self, move: Any, ply: int, depth: int) -> None:
+        """
+        Record that move caused a cutoff at ply in a search of depth moves.
+        """
+
+        self.history[move] = self.history.get(move, 0) + depth * depth
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+
+    def age(self) -> None:
+        """
+        Halve every history score, so that recent cutoffs count the most.
+        """
+
+        for move in self.history:
+            self.history[move] //= 2
+
+    def clear(self) -> None:
+        """
+        Forget everything learnt so far, e.g. when a new game starts.
+        """
+
+        self.history.clear()
+        self.killers.clear()
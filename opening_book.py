@@ -0,0 +1,183 @@
+"""
+An opening book of move win rates, built from self-play games.
+"""
+from typing import Any, Callable, Dict, List, Union
+import argparse
+import json
+import os
+import random
+from game import Game
+from game_state import GameState
+from stonehenge import Stonehenge, StonehengeState
+from strategy import rough_outcome_strategy
+
+
+class OpeningBook:
+    """
+    The number of wins and games of each move played from the opening
+    positions of self-play games, by the state key of the position. The book
+    is kept in a JSON file and only read the first time it is queried.
+
+    === Attributes ===
+    path - the file the book is kept in
+    max_plies - the number of moves from the start of a game recorded
+    min_games - the number of games a move needs before the book plays it
+    """
+    path: str
+    max_plies: int
+    min_games: int
+    _stats: Union[Dict[str, Dict[str, List[int]]], None]
+
+    def __init__(self, path: str, max_plies: int = 6,
+                 min_games: int = 10) -> None:
+        """
+        Initialize an OpeningBook kept in the file at path.
+        """
+
+        self.path = path
+        self.max_plies = max_plies
+        self.min_games = min_games
+        self._stats = None
+
+    def add_game(self, side_length: int, moves: List[str], p1_starts: bool,
+                 p1_won: bool) -> None:
+        """
+        Record the opening moves of a game on a board of side_length, played
+        from its start, where p1_won says who won.
+
+        >>> book = OpeningBook('unused.json', min_games=1)
+        >>> book.add_game(2, ['A', 'B', 'C'], True, True)
+        >>> book.win_rates(StonehengeState(True, 2))
+        {'A': 1.0}
+        """
+
+        stats = self._load()
+        state = StonehengeState(p1_starts, side_length)
+        for move in moves[:self.max_plies]:
+            position = stats.setdefault(state.to_key(), {})
+            record = position.setdefault(move, [0, 0])
+            if state.p1_turn == p1_won:
+                record[0] += 1
+            record[1] += 1
+            state = state.make_move(move)
+
+    def win_rates(self, state: GameState) -> Dict[str, float]:
+        """
+        Return the win rate of each move from state played in at least
+        self.min_games games.
+        """
+
+        position = self._load().get(state.to_key(), {})
+        return {move: wins / games
+                for move, (wins, games) in position.items()
+                if games >= self.min_games}
+
+    def lookup(self, state: GameState) -> Any:
+        """
+        Return the move from state with the best win rate in this book, or
+        None if the book has no move for state.
+        """
+
+        best_move = None
+        rates = self.win_rates(state)
+        for move in sorted(rates):
+            if best_move is None or rates[move] > rates[best_move]:
+                best_move = move
+        return best_move
+
+    def save(self) -> None:
+        """
+        Write this book to self.path, replacing it in one step so that a
+        crash never leaves half a book.
+        """
+
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as book_file:
+            json.dump(self._load(), book_file, separators=(',', ':'))
+        os.replace(temporary_path, self.path)
+
+    def _load(self) -> Dict[str, Dict[str, List[int]]]:
+        """
+        Return the statistics of this book, reading them from self.path the
+        first time.
+        """
+
+        if self._stats is None:
+            self._stats = {}
+            if os.path.exists(self.path):
+                with open(self.path) as book_file:
+                    self._stats = json.load(book_file)
+        return self._stats
+
+
+def self_play(book: OpeningBook, side_length: int, num_games: int,
+              strategy: Callable[[Game], Any], exploration: float = 0.25,
+              seed: int = None) -> None:
+    """
+    Play num_games games of strategy against itself on a board of
+    side_length and record them in book. Each move is random with
+    probability exploration, so the games cover several openings. Player
+    one starts half of the games.
+    """
+
+    rng = random.Random(seed)
+    for i in range(num_games):
+        game = Stonehenge(i % 2 == 0, side_length)
+        moves = []
+        while not game.is_over(game.current_state):
+            if rng.random() < exploration:
+                move = rng.choice(game.current_state.get_possible_moves())
+            else:
+                move = strategy(game)
+            moves.append(move)
+            game.current_state = game.current_state.make_move(move)
+        book.add_game(side_length, moves, game.p1_starts,
+                      game.is_winner('p1'))
+
+
+class BookStrategy:
+    """
+    A strategy that plays the best book move while the position is in its
+    opening book, and asks another strategy otherwise.
+
+    === Attributes ===
+    book - the opening book consulted before any search
+    strategy - the strategy used out of the book
+    """
+    book: OpeningBook
+    strategy: Callable[[Game], Any]
+
+    def __init__(self, book: OpeningBook,
+                 strategy: Callable[[Game], Any]) -> None:
+        """
+        Initialize a BookStrategy using book, then strategy.
+        """
+
+        self.book = book
+        self.strategy = strategy
+
+    def __call__(self, game: Game) -> Any:
+        """
+        Return a move for game from the book, or from self.strategy.
+        """
+
+        move = self.book.lookup(game.current_state)
+        if move is not None and game.current_state.is_valid_move(move):
+            return move
+        return self.strategy(game)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build an opening book '
+                                                 'from self-play games.')
+    parser.add_argument('path')
+    parser.add_argument('side_length', type=int)
+    parser.add_argument('num_games', type=int)
+    parser.add_argument('--max-plies', type=int, default=6)
+    parser.add_argument('--exploration', type=float, default=0.25)
+    arguments = parser.parse_args()
+
+    opening_book = OpeningBook(arguments.path, arguments.max_plies)
+    self_play(opening_book, arguments.side_length, arguments.num_games,
+              rough_outcome_strategy, arguments.exploration)
+    opening_book.save()
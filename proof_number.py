@@ -0,0 +1,257 @@
+"""
+A depth-first proof-number (df-pn) solver for two-player games.
+"""
+from typing import Any, Dict, List, Tuple, Union
+from game import Game
+from game_state import GameState
+from strategy import state_key, terminal_score
+
+# a proof or disproof number larger than any real one
+INFINITY = 10 ** 9
+
+# how far past the second best child the best one is searched before the
+# search comes back up to compare them again (the 1 + epsilon trick), so
+# that a small table does not make it switch between lines too often
+EPSILON = 2.0
+
+
+class ProofNumberSolver:
+    """
+    A df-pn solver that proves or disproves a win for the current player of
+    a state. Instead of searching every line like minimax, it always expands
+    the line that is cheapest to prove or disprove.
+
+    Proof and disproof numbers are kept for a win of one player, the
+    attacker. At states where the attacker moves (OR states), the proof
+    number is the smallest proof number of the children and the disproof
+    number is the sum of their disproof numbers; at the other states (AND
+    states), it is the other way round. A draw disproves the attacker's win
+    at both kinds of states.
+
+    When the table is full, it is cut back to half its size by dropping
+    the entries whose subtrees took the fewest expansions to search, since
+    they are the cheapest to find again. Unsolved entries go first: solved
+    ones are only dropped if they alone fill more than half the table.
+
+    === Attributes ===
+    game - the game whose states are solved
+    max_entries - the most states kept in the table at once
+    table - (proof number, disproof number) of searched states, by the
+            attacker and the state_key of the state
+    nodes - the number of states expanded so far
+    """
+    game: Game
+    max_entries: int
+    table: Dict[Tuple[str, str], Tuple[int, int]]
+    nodes: int
+    _work: Dict[Tuple[str, str], int]
+
+    def __init__(self, game: Game, max_entries: int = 1000000) -> None:
+        """
+        Initialize this ProofNumberSolver for game, keeping at most
+        max_entries states in its table.
+        """
+
+        self.game = game
+        self.max_entries = max_entries
+        self.table = {}
+        self.nodes = 0
+        self._work = {}
+
+    def is_win(self, state: GameState) -> bool:
+        """
+        Return whether the current player of state can guarantee a win.
+        A draw counts as not winning.
+        """
+
+        return self._proves(state, state.get_current_player_name())
+
+    def winning_move(self, state: GameState) -> Any:
+        """
+        Return a move that guarantees a win for the current player of state,
+        or None if there is no such move.
+        """
+
+        attacker = state.get_current_player_name()
+        if not self._proves(state, attacker):
+            return None
+        for move in state.get_possible_moves():
+            # the win is proven after the move: it is a winning one
+            key = (attacker, state_key(state.make_move(move)))
+            if self.table.get(key, (1, 1))[0] == 0:
+                return move
+        # the proof was dropped from a full table, so search it again
+        for move in state.get_possible_moves():
+            if self._proves(state.make_move(move), attacker):
+                return move
+        return None
+
+    def _proves(self, state: GameState, attacker: str) -> bool:
+        """
+        Return whether attacker can guarantee a win from state.
+        """
+
+        key = (attacker, state_key(state))
+        self._search(state, key, attacker, INFINITY, INFINITY)
+        return self.table[key][0] == 0
+
+    def _attacker_wins(self, state: GameState, attacker: str) -> bool:
+        """
+        Return whether attacker has won at state, where the game is over.
+        """
+
+        score = terminal_score(self.game, state)
+        if state.get_current_player_name() == attacker:
+            return score == GameState.WIN
+        return score == GameState.LOSE
+
+    def _store(self, key: Tuple[str, str], numbers: Tuple[int, int],
+               work: int) -> None:
+        """
+        Record numbers for the entry key, whose subtree took work
+        expansions to search, making room in the table if it is full.
+        """
+
+        if key not in self.table and len(self.table) >= self.max_entries:
+            self._make_room()
+        self.table[key] = numbers
+        self._work[key] = work
+
+    def _make_room(self) -> None:
+        """
+        Drop the entries with the smallest subtrees until the table is half
+        full, unsolved entries first.
+        """
+
+        target = self.max_entries // 2
+        unsolved = [key for key in self.table if 0 not in self.table[key]]
+        solved = [key for key in self.table if 0 in self.table[key]]
+        for keys in [unsolved, solved]:
+            keys.sort(key=self._work.__getitem__)
+            for key in keys[:max(0, len(self.table) - target)]:
+                del self.table[key]
+                del self._work[key]
+
+    def _search(self, state: GameState, key: Tuple[str, str], attacker: str,
+                proof_threshold: int, disproof_threshold: int) -> None:
+        """
+        Search state, whose table entry is key, until the proof number of a
+        win of attacker reaches proof_threshold or its disproof number
+        reaches disproof_threshold.
+        """
+
+        start = self.nodes
+        self.nodes += 1
+        if self.game.is_over(state):
+            if self._attacker_wins(state, attacker):
+                self._store(key, (0, INFINITY), 1)
+            else:
+                self._store(key, (INFINITY, 0), 1)
+            return
+
+        or_state = state.get_current_player_name() == attacker
+        # equivalent moves (e.g. dead cells) only need to be tried once.
+        # the keys of the children are found once, as they are looked up
+        # on every iteration.
+        children = []
+        for move in state.get_search_moves():
+            child = state.make_move(move)
+            # a move that ends the game the way the player to move wants
+            # settles state without searching more
+            if self.game.is_over(child):
+                if or_state and self._attacker_wins(child, attacker):
+                    self._store(key, (0, INFINITY),
+                                self._work.get(key, 0) + 1)
+                    return
+                if not or_state and not self._attacker_wins(child,
+                                                             attacker):
+                    self._store(key, (INFINITY, 0),
+                                self._work.get(key, 0) + 1)
+                    return
+            children.append((child, (attacker, state_key(child))))
+        while True:
+            numbers = [self.table.get(child_key, (1, 1))
+                       for _, child_key in children]
+            proof, disproof = _combine(numbers, or_state)
+            if proof >= proof_threshold or disproof >= disproof_threshold:
+                break
+            if or_state:
+                # the child easiest to prove decides our proof number, and
+                # its disproof number is part of ours
+                best, second = _select([pn for pn, _ in numbers])
+                child_proof, child_disproof = numbers[best]
+                child_thresholds = (
+                    min(proof_threshold, int(second * (1 + EPSILON)) + 1),
+                    min(disproof_threshold - disproof + child_disproof,
+                        INFINITY))
+            else:
+                # the child easiest to disprove decides our disproof number,
+                # and its proof number is part of ours
+                best, second = _select([dn for _, dn in numbers])
+                child_proof, child_disproof = numbers[best]
+                child_thresholds = (
+                    min(proof_threshold - proof + child_proof, INFINITY),
+                    min(disproof_threshold, int(second * (1 + EPSILON)) + 1))
+            self._search(children[best][0], children[best][1], attacker,
+                         child_thresholds[0], child_thresholds[1])
+        # the work of earlier searches of this state counts too
+        self._store(key, (proof, disproof),
+                    self._work.get(key, 0) + self.nodes - start)
+
+
+def _combine(numbers: List[Tuple[int, int]],
+             or_state: bool) -> Tuple[int, int]:
+    """
+    Return the (proof number, disproof number) of a state whose children
+    have the (proof number, disproof number) pairs in numbers, where the
+    attacker moves iff or_state.
+
+    >>> _combine([(1, 3), (2, 1)], True)
+    (1, 4)
+    >>> _combine([(1, 3), (2, 1)], False)
+    (3, 1)
+    >>> _combine([(0, INFINITY), (INFINITY, 0)], False)
+    (1000000000, 0)
+    """
+
+    proofs = [proof for proof, _ in numbers]
+    disproofs = [disproof for _, disproof in numbers]
+    if or_state:
+        return min(proofs), min(sum(disproofs), INFINITY)
+    return min(sum(proofs), INFINITY), min(disproofs)
+
+
+def _select(values: List[int]) -> Tuple[int, int]:
+    """
+    Return the index of the smallest of values, and the second smallest
+    value.
+
+    >>> _select([3, 1, 2])
+    (1, 2)
+    """
+
+    best = 0
+    second = INFINITY
+    for i in range(1, len(values)):
+        if values[i] < values[best]:
+            second = values[best]
+            best = i
+        elif values[i] < second:
+            second = values[i]
+    return best, second
+
+
+def proof_number_strategy(game: Game) -> Union[str, int, None]:
+    """
+    Return a move for game that guarantees a win for the current player if
+    one exists, found by proof-number search. Otherwise, return the first
+    possible move.
+    """
+
+    solver = ProofNumberSolver(game)
+    move = solver.winning_move(game.current_state)
+    if move is None:
+        moves = game.current_state.get_possible_moves()
+        if moves:
+            move = moves[0]
+    return move
@@ -0,0 +1,136 @@
+"""
+A vectorized engine for random Stonehenge playouts, built on NumPy.
+"""
+from typing import Any, Dict, List, Union
+import numpy as np
+from game import Game
+from stonehenge import StonehengeState
+
+
+class RolloutEngine:
+    """
+    Plays many independent random Stonehenge games in lockstep, starting
+    from the same StonehengeState. Every game is a row of NumPy arrays, so
+    each ply of all the games is played with a few array operations.
+
+    === Attributes ===
+    state - the StonehengeState the playouts start from
+    cells - the unclaimed cells of state, in alphabetical order
+    incidence - a (cells x ley-lines) matrix of 1s where a cell is on a
+    ley-line
+    line_sizes - the number of cells on each ley-line
+    claimed - the number of cells of each ley-line already claimed by p1
+    (row 0) and p2 (row 1) in state
+    owners - the owner of each ley-line in state: 0 if unclaimed, else 1 or 2
+    """
+    state: StonehengeState
+    cells: List[str]
+    incidence: np.ndarray
+    line_sizes: np.ndarray
+    claimed: np.ndarray
+    owners: np.ndarray
+
+    def __init__(self, state: StonehengeState, seed: int = None) -> None:
+        """
+        Initialize a RolloutEngine for playouts from state, with random
+        numbers seeded by seed.
+        """
+
+        self.state = state
+        self._rng = np.random.default_rng(seed)
+        ley_lines = sorted(state.gameboard)
+        self.cells = state.get_possible_moves()
+
+        self.incidence = np.zeros((len(self.cells), len(ley_lines)),
+                                  dtype=np.int16)
+        self.line_sizes = np.zeros(len(ley_lines), dtype=np.int16)
+        self.claimed = np.zeros((2, len(ley_lines)), dtype=np.int16)
+        self.owners = np.zeros(len(ley_lines), dtype=np.int8)
+
+        for j, ley_line in enumerate(ley_lines):
+            self.line_sizes[j] = len(state.gameboard[ley_line])
+            for cell in state.gameboard[ley_line]:
+                if cell == 1 or cell == 2:
+                    self.claimed[cell - 1, j] += 1
+                elif cell in self.cells:
+                    self.incidence[self.cells.index(cell), j] = 1
+            if str(state.ley_lines[ley_line]).isdigit():
+                self.owners[j] = state.ley_lines[ley_line]
+
+    def playout(self, num_games: int,
+                first_moves: Union[np.ndarray, None] = None) -> np.ndarray:
+        """
+        Play num_games random games from self.state and return the winner of
+        each of them, 1 for p1 and 2 for p2. If first_moves is given, game i
+        starts by claiming the cell self.cells[first_moves[i]].
+
+        Precondition: self.state is not over.
+        """
+
+        num_lines = len(self.line_sizes)
+        free = np.ones((num_games, len(self.cells)), dtype=bool)
+        claimed = np.repeat(self.claimed[:, np.newaxis, :], num_games, axis=1)
+        owners = np.repeat(self.owners[np.newaxis, :], num_games, axis=0)
+        winners = np.zeros(num_games, dtype=np.int8)
+        active = np.ones(num_games, dtype=bool)
+        player = 1 if self.state.p1_turn else 2
+
+        while active.any():
+            games = np.flatnonzero(active)
+            if first_moves is not None:
+                picks = np.asarray(first_moves)[games]
+                first_moves = None
+            else:
+                # the free cell with the largest random key is claimed
+                keys = self._rng.random((len(games), len(self.cells)))
+                keys[~free[games]] = -1.0
+                picks = keys.argmax(axis=1)
+            free[games, picks] = False
+            claimed[player - 1, games] += self.incidence[picks]
+
+            # the player captures the unclaimed ley-lines where they now
+            # hold at least half of the cells
+            captured = ((owners[games] == 0)
+                        & (2 * claimed[player - 1, games] >= self.line_sizes))
+            owners[games] = np.where(captured, player, owners[games])
+
+            # the player wins with at least half of the ley-lines
+            won = 2 * (owners[games] == player).sum(axis=1) >= num_lines
+            winners[games[won]] = player
+            active[games[won]] = False
+            player = 3 - player
+
+        return winners
+
+    def root_win_rates(self, playouts_per_move: int) -> Dict[str, float]:
+        """
+        Return, for each possible move of self.state, the fraction of
+        playouts_per_move random games starting with that move which are
+        won by the current player of self.state.
+
+        Precondition: self.state is not over.
+        """
+
+        player = 1 if self.state.p1_turn else 2
+        first_moves = np.repeat(np.arange(len(self.cells)), playouts_per_move)
+        winners = self.playout(len(first_moves), first_moves)
+        wins = (winners == player).reshape(len(self.cells), playouts_per_move)
+        rates = wins.mean(axis=1)
+        return {cell: float(rates[i]) for i, cell in enumerate(self.cells)}
+
+
+def rollout_strategy(game: Game, playouts_per_move: int = 1000) -> Any:
+    """
+    Return the move for game whose random playouts are won most often by
+    the current player.
+    """
+
+    if game.is_over(game.current_state):
+        return None
+    rates = RolloutEngine(game.current_state).root_win_rates(
+        playouts_per_move)
+    best_move = None
+    for move in rates:
+        if best_move is None or rates[move] > rates[best_move]:
+            best_move = move
+    return best_move
@@ -1,7 +1,7 @@
 """
 The Stonehenge Game and the Stonehenge GameState.
 """
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Tuple, Union
 from game import Game
 from game_state import GameState
 
@@ -36,6 +36,48 @@ def modify_board(board: Dict[int, Union[List[str], List[int]]],
             ley_lines[ley_line] = num
 
 
+def _cell_slots(side_length: int) -> List[Tuple[str, int, int]]:
+    """
+    Return (cell, ley-line, index) for each cell of a new board of
+    side_length, in alphabetical order, where the cell is at position index
+    of that ley-line.
+
+    >>> _cell_slots(1)
+    [('A', 1, 0), ('B', 2, 0), ('C', 2, 1)]
+    """
+
+    if side_length not in _CELL_SLOTS:
+        gameboard = StonehengeState(True, side_length).gameboard
+        slots = {}
+        for ley_line in gameboard:
+            for index in range(len(gameboard[ley_line])):
+                cell = gameboard[ley_line][index]
+                if cell not in slots:
+                    slots[cell] = (cell, ley_line, index)
+        _CELL_SLOTS[side_length] = [slots[cell] for cell in sorted(slots)]
+    return _CELL_SLOTS[side_length]
+
+
+# the cells of each side length, as found by _cell_slots
+_CELL_SLOTS = {}
+
+# the side lengths a board can have
+SIDE_LENGTHS = range(1, 6)
+
+
+def _is_over(ley_lines: Dict[int, Union[int, str]]) -> bool:
+    """
+    Return whether a player has captured at least half of ley_lines.
+
+    >>> _is_over({1: 1, 2: '@'})
+    True
+    >>> _is_over({1: 1, 2: '@', 3: 2})
+    False
+    """
+
+    owners = list(ley_lines.values())
+    return max(owners.count(1), owners.count(2)) >= len(owners) / 2
+
 # CONSTANTS FOR TESTING
 
 GAMEBOARD_1 = {1: ['A'], 2: ['B', 'C'], 3: ['B'], 4: ['A', 'C'],
@@ -448,6 +490,40 @@ class StonehengeState(GameState):
         possible_moves.sort()  # sort in alphabetical order
         return possible_moves
 
+    def get_search_moves(self) -> List[str]:
+        """
+        Return the possible moves of this Stonehenge state, keeping only the
+        first of the dead cells. A cell is dead when all the ley-lines that
+        hold it are captured already: claiming it cannot capture anything,
+        so every dead cell leads to a state with the same score.
+
+        >>> s = StonehengeState(True, 3)
+        >>> for move in ['F', 'A', 'I', 'E', 'B', 'L', 'G', 'K']:
+        ...     s = s.make_move(move)
+        >>> s.get_possible_moves()
+        ['C', 'D', 'H', 'J']
+        >>> s.get_search_moves()
+        ['C', 'D', 'H']
+        """
+
+        search_moves = []
+        dead_cell_found = False
+
+        for move in self.get_possible_moves():
+            # a cell is live if one of its ley-lines is still unclaimed
+            is_live = False
+            for ley_line in self.gameboard:
+                if (move in self.gameboard[ley_line]
+                        and not str(self.ley_lines[ley_line]).isdigit()):
+                    is_live = True
+            if is_live:
+                search_moves.append(move)
+            elif not dead_cell_found:
+                search_moves.append(move)
+                dead_cell_found = True
+
+        return search_moves
+
     def make_move(self, move: Any) -> 'StonehengeState':
         """
         Return the StonehengeState that results from applying move to this
@@ -486,6 +562,159 @@ class StonehengeState(GameState):
 
         return new_state
 
+    @classmethod
+    def from_moves(cls, side_length: int, moves: List[str],
+                   p1_starts: bool = True) -> 'StonehengeState':
+        """
+        Return the StonehengeState reached by applying moves to a new board
+        of side_length, where p1 moves first iff p1_starts. The moves are all
+        applied to the same working board. Raise a ValueError if side_length
+        is not one of SIDE_LENGTHS or if a move is not a possible move.
+
+        >>> s = StonehengeState.from_moves(1, ['A'])
+        >>> s.gameboard == GAMEBOARD_1_MAKE_MOVE_A
+        True
+        >>> s.p1_turn
+        False
+        >>> repr(s) == repr(StonehengeState(True, 1).make_move('A'))
+        True
+        >>> StonehengeState.from_moves(2, ['A', 'A'])
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid move A after 1 moves
+        """
+
+        if side_length not in SIDE_LENGTHS:
+            raise ValueError('invalid side length {}'.format(side_length))
+        state = cls(p1_starts, side_length)
+        # the cells not claimed yet, as in get_possible_moves
+        unclaimed = set(cell for cell, _, _ in _cell_slots(side_length)
+                        if not cell.isdigit())
+        for i in range(len(moves)):
+            move = moves[i]
+            if move not in unclaimed or _is_over(state.ley_lines):
+                raise ValueError('invalid move {} after {} moves'
+                                 .format(move, i))
+            unclaimed.remove(move)
+            # the new state's dicts are never shared, so modify them in place
+            if state.p1_turn:
+                modify_board(state.gameboard, state.ley_lines, move, 1)
+            else:
+                modify_board(state.gameboard, state.ley_lines, move, 2)
+            state.p1_turn = not state.p1_turn
+        return state
+
+    @classmethod
+    def from_key(cls, key: str) -> 'StonehengeState':
+        """
+        Return the StonehengeState encoded by key, as returned by to_key().
+        Raise a ValueError if key is malformed, if its players do not have
+        cell counts that taking turns allows, if its ley-line owners do not
+        match its cells, or if it is a finished game that both players won
+        or that the player to move won. Keys passing these checks may still
+        encode a state no game reaches, e.g. one played on after its end.
+
+        >>> s = StonehengeState.from_moves(2, ['A', 'E', 'C'])
+        >>> repr(StonehengeState.from_key(s.to_key())) == repr(s)
+        True
+        >>> StonehengeState.from_key('1|2|1..|@@@@@@')
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid key 1|2|1..|@@@@@@: wrong ley-line owners
+        >>> StonehengeState.from_key('3|1|112211122.22|112212212121')
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid key 3|1|112211122.22|112212212121: both players \
+won
+        >>> StonehengeState.from_key('1|1|12.|1221@1')
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid key 1|1|12.|1221@1: the winner is to move
+        """
+
+        fields = key.split('|')
+        if (len(fields) != 4 or not fields[0].isdigit()
+                or int(fields[0]) not in SIDE_LENGTHS
+                or fields[1] not in ('1', '2')):
+            raise ValueError('invalid key {}'.format(key))
+        side_length, player, cells, ley_line_owners = fields
+        state = cls(player == '1', int(side_length))
+        slots = _cell_slots(state.side_length)
+        if (len(cells) != len(slots) or set(cells) - set('.12')
+                or len(ley_line_owners) != len(state.ley_lines)
+                or set(ley_line_owners) - set('@12')):
+            raise ValueError('invalid key {}'.format(key))
+        # the players take turns, so the player to move has as many cells
+        # as the other one, or one less if the other one started
+        if player == '1':
+            behind, ahead = cells.count('1'), cells.count('2')
+        else:
+            behind, ahead = cells.count('2'), cells.count('1')
+        if ahead - behind not in (0, 1):
+            raise ValueError('invalid key {}: wrong number of cells of each '
+                             'player'.format(key))
+
+        for cell, owner in zip(slots, cells):
+            if owner != '.':
+                for ley_line in state.gameboard:
+                    if cell[0] in state.gameboard[ley_line]:
+                        index = state.gameboard[ley_line].index(cell[0])
+                        state.gameboard[ley_line][index] = int(owner)
+        for ley_line, owner in zip(sorted(state.ley_lines), ley_line_owners):
+            if owner != '@':
+                state.ley_lines[ley_line] = int(owner)
+
+        # a ley-line is captured as soon as a player has half of its cells
+        for ley_line in state.gameboard:
+            cells_of = state.gameboard[ley_line]
+            half = len(cells_of) / 2
+            owner = state.ley_lines[ley_line]
+            if ((owner == '@' and max(cells_of.count(1),
+                                      cells_of.count(2)) >= half)
+                    or (owner != '@' and cells_of.count(owner) < half)):
+                raise ValueError('invalid key {}: wrong ley-line owners'
+                                 .format(key))
+
+        # the game ends as soon as a player has half of the ley-lines, so
+        # only one player can have them, and that player moved last
+        owners = list(state.ley_lines.values())
+        half = len(owners) / 2
+        if owners.count(1) >= half and owners.count(2) >= half:
+            raise ValueError('invalid key {}: both players won'.format(key))
+        if owners.count(int(player)) >= half:
+            raise ValueError('invalid key {}: the winner is to move'
+                             .format(key))
+        return state
+
+    def to_key(self) -> str:
+        """
+        Return a compact str encoding this StonehengeState: its side length,
+        the current player, the owner of each cell in alphabetical order
+        ('.' if unclaimed) and the owner of each ley-line.
+
+        >>> StonehengeState.from_moves(1, ['A']).to_key()
+        '1|2|1..|1@@1@1'
+        """
+
+        cells = ''
+        for _, ley_line, index in _cell_slots(self.side_length):
+            owner = self.gameboard[ley_line][index]
+            if owner == 1 or owner == 2:
+                cells += str(owner)
+            else:
+                cells += '.'
+
+        ley_line_owners = ''
+        for ley_line in sorted(self.ley_lines):
+            ley_line_owners += str(self.ley_lines[ley_line])
+
+        if self.p1_turn:
+            player = '1'
+        else:
+            player = '2'
+        return '{}|{}|{}|{}'.format(self.side_length, player, cells,
+                                    ley_line_owners)
+
     def __repr__(self) -> Any:
         """
         Return a representation of this StonehengeState (which can be used for
@@ -560,18 +789,19 @@ class Stonehenge(Game):
     p1_starts: bool
     current_state: StonehengeState
 
-    def __init__(self, p1_starts: bool) -> None:
+    def __init__(self, p1_starts: bool, side_length: int = None) -> None:
         """
         Initialize this Stonehenge game, using p1_starts to find who the first
-        player is.
+        player is. The user is asked for the side length of the board if
+        side_length is not given.
         """
 
         self.p1_starts = p1_starts
 
         if p1_starts:
-            self.current_state = StonehengeState(True)
+            self.current_state = StonehengeState(True, side_length)
         elif not p1_starts:
-            self.current_state = StonehengeState(False)
+            self.current_state = StonehengeState(False, side_length)
 
     def get_instructions(self) -> str:
         """
@@ -1,10 +1,15 @@
 """
 A module for strategies.
 """
-from typing import Any, Union
+from typing import Any, Dict, List, Union
+import copy
+import threading
+import time
 from game import Game
 from game_state import GameState
-from gametree import GameTree
+from endgame import EndgameTable
+from move_ordering import MoveOrdering
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
 
 
 def interactive_strategy(game: Any) -> Union[str, int]:
@@ -89,7 +94,8 @@ def recursive_state(game: Game, current_state: GameState) -> int:
         # append the score returned and multiply it by -1, since the
         # current_player of that state is the other_player for
         # our original state. (zero-sum game)
-        for move in current_state.get_possible_moves():
+        # equivalent moves (e.g. dead cells) only need to be tried once.
+        for move in current_state.get_search_moves():
             new_state = current_state.make_move(move)
             scores.append(-1 * recursive_state(game, new_state))
 
@@ -157,75 +163,476 @@ def iterative_minimax_strategy(game: Game) -> Any:
     """
     Return a move for game that yields the "highest guaranteed score"
     iteratively for each step for current player.
+
+    Only the states on the path being searched are kept: each frame of the
+    stack holds a state, an iterator over its moves that is advanced one move
+    at a time, the best score found so far for the state and the last move
+    tried from it.
     """
 
-    # create an empty list for holding game-trees
-    game_stack = []
-    # store the game's current_state in a GameTree
-    initial_game_tree = GameTree(game.current_state)
-    # append the GameTree to the game_stack
-    game_stack.append(initial_game_tree)
-    # store game's current_state in old_state
-    old_state = game.current_state
+    if game.is_over(game.current_state):
+        return None
+
+    # every move of the root is a candidate, but below it equivalent moves
+    # (e.g. dead cells) only need to be tried once
+    moves = game.current_state.get_possible_moves()
+    game_stack = [[game.current_state, iter(moves), GameState.LOSE - 1, None]]
+    root_scores = []  # the score of each root move searched, in order
 
     while game_stack != []:
-        game_tree = game_stack.pop()  # pop the last GameTree appended
-        game_state = game_tree.state
-        current_player = game_state.get_current_player_name()
-        # set current_player and other_player to either 'p1' or 'p2'
-        if current_player == 'p1':
-            other_player = 'p2'
+        frame = game_stack[-1]
+        move = next(frame[1], None)
+        # nothing beats a win, so the other moves need not be searched
+        if move is None or frame[2] == GameState.WIN:
+            game_stack.pop()
+            if game_stack != []:
+                # multiply by -1 because of the game's zero-sum rule.
+                score = -1 * frame[2]
+                game_stack[-1][2] = max(game_stack[-1][2], score)
+                if len(game_stack) == 1:
+                    root_scores.append((game_stack[-1][3], score))
+            continue
+
+        frame[3] = move
+        new_state = frame[0].make_move(move)
+        if game.is_over(new_state):  # check if state is over
+            score = -1 * terminal_score(game, new_state)
+            frame[2] = max(frame[2], score)
+            if len(game_stack) == 1:
+                root_scores.append((move, score))
         else:
-            other_player = 'p1'
-        if game.is_over(game_state):  # check if state is over
-            game.current_state = game_state
-            # set the node's score to 1 if current_player won
-            if game.is_winner(current_player):
-                game.current_state = old_state
-                game_tree.score = 1
-            # set the node's score to -1 if other_player won
-            elif game.is_winner(other_player):
-                game.current_state = old_state
-                game_tree.score = -1
-            # else, set the node's score to 0 for a tie
-            else:
-                game.current_state = old_state
-                game_tree.score = 0
-        # if we haven't looked at the game_tree yet,
-        elif not game_tree.children:
-            game_tree.children = []
-            # access the new_states and append them as children
-            for move in game_tree.state.get_possible_moves():
-                new_state = game_tree.state.make_move(move)
-                child = GameTree(state=new_state, move=move)
-                game_tree.children.append(child)
-            # append the ga-me_tree and its children into game_stack
-            game_stack.append(game_tree)
-            for child in game_tree.children:
-                game_stack.append(child)
-        # if we did visit the node before...
-        elif game_tree.children:
-            child_scores = []  # create a child_scores list to store scores
-            for child in game_tree.children:
-                # append the opposite of the score (zero-sum rule)
-                child_scores.append(-1 * child.score)
-            # set the highest guaranteed score to the state
-            game_tree.score = max(child_scores)
-
-    # loop through the states reachable by the initial_game_tree
-    # since the child scores are still for the other_player, we multiply
-    # them by -1.
-    for child in initial_game_tree.children:
-        # look for the child with the highest guaranteed score
-        if child.score == -1:
-            # return the corresponding move that guarantees a win
-            return child.move
-    # if not, return the move that guarantees a tie for the current_player
-    for child in initial_game_tree.children:
-        if child.score == 0:
-            return child.move
-    # else, return the last resort.
-    for child in initial_game_tree.children:
-        if child.score == 1:
-            return child.move
+            game_stack.append([new_state, iter(new_state.get_search_moves()),
+                               GameState.LOSE - 1, None])
+
+    # return the move that guarantees a win, then a tie, then the last resort
+    for best_score in [GameState.WIN, GameState.DRAW, GameState.LOSE]:
+        for move, score in root_scores:
+            if score == best_score:
+                return move
     return None
+
+
+class TreeReuseStrategy:
+    """
+    A minimax strategy that keeps what it searched between calls, so that
+    later turns of a game start with most of their work done.
+
+    The score and best move of every state searched are kept in a
+    transposition table keyed by state, so the part of an earlier search
+    below the moves actually played is found again as it is. States with
+    more moves left than the current one can no longer be reached, so their
+    entries are discarded to make room once the table is half full.
+
+    === Attributes ===
+    table - exact scores of the states searched so far, keyed by state_key
+    """
+    table: TranspositionTable
+
+    def __init__(self, size_mb: float = 64) -> None:
+        """
+        Initialize this TreeReuseStrategy with an empty transposition table
+        of size_mb megabytes.
+        """
+
+        self.table = TranspositionTable(size_mb)
+
+    def __call__(self, game: Game) -> Any:
+        """
+        Return a move for game that yields the "highest guaranteed score"
+        for the current player, reusing the scores of the previous calls.
+        """
+
+        moves = game.current_state.get_possible_moves()
+        if self.table.fill_rate() > 0.5:
+            self.table.discard_deeper(len(moves))
+
+        scores = {}  # a dict to record the score of each move
+        for move in moves:
+            new_state = game.current_state.make_move(move)
+            scores[move] = -1 * cached_state_value(game, new_state,
+                                                   self.table)
+            # nothing beats a win, so the other moves need not be searched
+            if scores[move] == GameState.WIN:
+                break
+
+        # return the move that guarantees a win, then a tie, then the last
+        # resort
+        for score in [GameState.WIN, GameState.DRAW, GameState.LOSE]:
+            for move in scores:
+                if scores[move] == score:
+                    return move
+        return None
+
+
+class SearchCancelled(Exception):
+    """
+    Raised inside a search that has been asked to stop.
+    """
+    pass
+
+
+def state_key(state: GameState) -> str:
+    """
+    Return a key identifying state, for use in caches of searched states.
+    """
+
+    return state.to_key()
+
+
+def terminal_score(game: Game, state: GameState) -> int:
+    """
+    Return the score of the current player of state, where game is over at
+    state. game.current_state is left unchanged.
+    """
+
+    current_player = state.get_current_player_name()
+    # set other_player to either 'p1' or 'p2'
+    if current_player == 'p1':
+        other_player = 'p2'
+    else:
+        other_player = 'p1'
+    old_state = game.current_state
+    game.current_state = state
+    if game.is_winner(current_player):
+        score = GameState.WIN
+    elif game.is_winner(other_player):
+        score = GameState.LOSE
+    else:
+        score = GameState.DRAW
+    game.current_state = old_state
+    return score
+
+
+def cached_state_value(game: Game, state: GameState,
+                       table: TranspositionTable,
+                       stop: threading.Event = None,
+                       stats: Dict[str, int] = None,
+                       endgame: EndgameTable = None,
+                       ordering: MoveOrdering = None) -> int:
+    """
+    Return the highest guaranteed score for the current player of state,
+    storing the score and best move of every state that is fully searched
+    in table. If stats is given, stats['nodes'] is increased by the number
+    of states searched that were not in table. If endgame is given, the
+    states it covers are looked up in it instead of searched. If ordering
+    is given, it orders the moves and learns from the winning ones.
+
+    Raise SearchCancelled if stop is set before the search is over. The
+    scores already in table stay exact.
+    """
+
+    key = state_key(state)
+    entry = table.probe(key)
+    if entry is not None and entry[2] == EXACT:
+        return int(entry[0])
+    if stop is not None and stop.is_set():
+        raise SearchCancelled
+    if stats is not None:
+        stats['nodes'] = stats.get('nodes', 0) + 1
+    if endgame is not None:
+        score = endgame.probe(state)
+        if score is not None:
+            return score
+
+    best_move = None
+    moves = []
+    if game.is_over(state):
+        score = terminal_score(game, state)
+    else:
+        score = GameState.LOSE - 1
+        moves = state.get_search_moves()
+        if ordering is not None:
+            moves = ordering.order(moves, len(moves))
+        for move in moves:
+            new_state = state.make_move(move)
+            # multiply by -1 because of the game's zero-sum rule.
+            new_score = -1 * cached_state_value(game, new_state, table, stop,
+                                                stats, endgame, ordering)
+            if new_score > score:
+                score = new_score
+                best_move = move
+            # nothing beats a win, so the other moves need not be searched
+            if score == GameState.WIN:
+                if ordering is not None:
+                    ordering.record_cutoff(move, len(moves), len(moves))
+                break
+
+    # states with more moves left took longer to search
+    table.store(key, score, len(moves), EXACT, best_move)
+    return score
+
+
+def bounded_state_value(game: Game, state: GameState, depth: int,
+                        alpha: float, beta: float, table: TranspositionTable,
+                        deadline: float = None,
+                        endgame: EndgameTable = None,
+                        ordering: MoveOrdering = None) -> float:
+    """
+    Return the score for the current player of state found by an alpha-beta
+    search of depth moves, storing what it finds in table. A score of at
+    most alpha is only an upper bound and a score of at least beta is only a
+    lower bound.
+
+    States at depth 0 are scored by half their rough_outcome(), so a score
+    of WIN or LOSE is always a proven one. If endgame is given, the states
+    it covers are looked up in it instead of searched. If ordering is
+    given, it orders the moves and learns from the ones causing cutoffs.
+
+    Raise SearchCancelled once time.monotonic() is past deadline.
+    """
+
+    if deadline is not None and time.monotonic() > deadline:
+        raise SearchCancelled
+
+    key = state_key(state)
+    entry = table.probe(key)
+    best_move = None
+    if entry is not None:
+        value, entry_depth, bound, best_move = entry
+        # proven wins and losses hold at any depth
+        if entry_depth >= depth or abs(value) == GameState.WIN:
+            if (bound == EXACT or (bound == LOWER and value >= beta)
+                    or (bound == UPPER and value <= alpha)):
+                return value
+
+    if game.is_over(state):
+        score = terminal_score(game, state)
+        table.store(key, score, depth, EXACT)
+        return score
+    if endgame is not None:
+        score = endgame.probe(state)
+        if score is not None:
+            return score
+    if depth == 0:
+        return state.rough_outcome() / 2
+
+    moves = state.get_search_moves()
+    ply = len(moves)
+    if ordering is not None:
+        moves = ordering.order(moves, ply)
+    # try the best move of an earlier search first
+    if best_move in moves:
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+
+    original_alpha = alpha
+    score = GameState.LOSE - 1
+    for move in moves:
+        new_state = state.make_move(move)
+        # multiply by -1 because of the game's zero-sum rule.
+        new_score = -1 * bounded_state_value(game, new_state, depth - 1,
+                                             -beta, -alpha, table, deadline,
+                                             endgame, ordering)
+        if new_score > score:
+            score = new_score
+            best_move = move
+        alpha = max(alpha, score)
+        # the opponent will not allow this state, so stop searching it
+        if alpha >= beta:
+            if ordering is not None:
+                ordering.record_cutoff(move, ply, depth)
+            break
+
+    if score <= original_alpha:
+        bound = UPPER
+    elif score >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    table.store(key, score, depth, bound, best_move)
+    return score
+
+
+class MoveAnalysis:
+    """
+    The analysis of one move of a state.
+
+    === Attributes ===
+    move - the move analysed
+    score - the highest guaranteed score for the player making move
+    bound - EXACT, or LOWER/UPPER if score is only a bound on it
+    pv - the principal variation: move, followed by the best replies
+    nodes - the number of states searched for this move
+    """
+    move: Any
+    score: int
+    bound: int
+    pv: List[Any]
+    nodes: int
+
+    def __init__(self, move: Any, score: int, bound: int, pv: List[Any],
+                 nodes: int) -> None:
+        """
+        Initialize a new MoveAnalysis.
+        """
+
+        self.move = move
+        self.score = score
+        self.bound = bound
+        self.pv = pv
+        self.nodes = nodes
+
+    def __repr__(self) -> str:
+        """
+        Return a representation of this MoveAnalysis.
+        """
+
+        return 'MoveAnalysis({!r}, {}, {}, {}, {})'.format(
+            self.move, self.score, self.bound, self.pv, self.nodes)
+
+
+def analyze_moves(game: Game, table: TranspositionTable = None,
+                  endgame: EndgameTable = None) -> List[MoveAnalysis]:
+    """
+    Return the analysis of every possible move of game.current_state, in
+    the order of get_possible_moves(). All the moves are searched with the
+    same transposition table, so the states they share are searched once.
+    The states covered by endgame, if given, are looked up in it.
+    """
+
+    if table is None:
+        table = TranspositionTable()
+
+    analyses = []
+    for move in game.current_state.get_possible_moves():
+        stats = {'nodes': 0}
+        new_state = game.current_state.make_move(move)
+        # every move is searched to the end, so its score is exact
+        score = -1 * cached_state_value(game, new_state, table, None, stats,
+                                        endgame)
+
+        # follow the best moves recorded in table for the variation
+        pv = [move]
+        entry = table.probe(state_key(new_state))
+        while entry is not None and entry[3] is not None:
+            pv.append(entry[3])
+            new_state = new_state.make_move(entry[3])
+            entry = table.probe(state_key(new_state))
+        analyses.append(MoveAnalysis(move, score, EXACT, pv, stats['nodes']))
+    return analyses
+
+
+class PonderingStrategy:
+    """
+    A minimax strategy that keeps searching while the opponent is thinking.
+
+    After each move, a background thread searches the opponent's likely
+    replies and records their scores in a transposition table shared with
+    the next search, which therefore starts warm. The background search is
+    cancelled when the strategy is called again, or by calling
+    stop_pondering() as soon as the opponent's move arrives (e.g. from
+    Stonehenge.str_to_move).
+
+    === Attributes ===
+    table - exact scores of the states searched so far, keyed by state_key
+    endgame - the endgame table probed by the searches, or None
+    ordering - the move ordering learnt in the searches of the current game
+    """
+    table: TranspositionTable
+    endgame: Union[EndgameTable, None]
+    ordering: MoveOrdering
+    _game: Union[Game, None]
+    _stop: threading.Event
+    _thread: Union[threading.Thread, None]
+
+    def __init__(self, size_mb: float = 64,
+                 endgame: EndgameTable = None) -> None:
+        """
+        Initialize this PonderingStrategy with an empty transposition table
+        of size_mb megabytes, probing endgame if it is given.
+        """
+
+        self.table = TranspositionTable(size_mb)
+        self.endgame = endgame
+        self.ordering = MoveOrdering()
+        self._game = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __call__(self, game: Game) -> Any:
+        """
+        Return a move for game that yields the "highest guaranteed score"
+        for the current player, then start pondering on the opponent's reply.
+        """
+
+        self.stop_pondering()
+        # what was learnt about move ordering only applies to the same game
+        if game is not self._game:
+            self.ordering.clear()
+            self._game = game
+        self.ordering.age()
+
+        scores = {}  # a dict to record the score of each move
+        for move in game.current_state.get_possible_moves():
+            new_state = game.current_state.make_move(move)
+            scores[move] = -1 * cached_state_value(game, new_state,
+                                                   self.table, None, None,
+                                                   self.endgame, self.ordering)
+            # nothing beats a win, so the other moves need not be searched
+            if scores[move] == GameState.WIN:
+                break
+
+        best_move = None
+        # prefer a win, then a tie, then the last resort
+        for score in [GameState.WIN, GameState.DRAW, GameState.LOSE]:
+            for move in scores:
+                if best_move is None and scores[move] == score:
+                    best_move = move
+
+        if best_move is not None:
+            self.start_pondering(game,
+                                 game.current_state.make_move(best_move))
+        return best_move
+
+    def start_pondering(self, game: Game, state: GameState) -> None:
+        """
+        Start searching the opponent's replies to state in the background.
+        """
+
+        self.stop_pondering()
+        self._stop = threading.Event()
+        # the background search works on its own copy of game, since
+        # scoring a state temporarily changes game.current_state
+        self._thread = threading.Thread(target=self._ponder,
+                                        args=(copy.copy(game), state,
+                                              self._stop),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop_pondering(self) -> None:
+        """
+        Cancel the background search, if any, and wait for it to finish.
+        """
+
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _ponder(self, game: Game, state: GameState,
+                stop: threading.Event) -> None:
+        """
+        Record the scores of the states reachable by the opponent's replies
+        to state in self.table until stop is set.
+        """
+
+        if game.is_over(state):
+            return
+
+        # search first the replies the opponent is most likely to play,
+        # i.e. those leaving us the lowest rough outcome. ranking them takes
+        # a while on big boards, so it can be cancelled too.
+        replies = []
+        for move in state.get_possible_moves():
+            if stop.is_set():
+                return
+            new_state = state.make_move(move)
+            replies.append((new_state.rough_outcome(), new_state))
+        replies.sort(key=lambda reply: reply[0])
+
+        for _, new_state in replies:
+            try:
+                cached_state_value(game, new_state, self.table, stop, None,
+                                   self.endgame, self.ordering)
+            except SearchCancelled:
+                return
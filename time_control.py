@@ -0,0 +1,197 @@
+"""
+Whole-game time management for searching strategies.
+"""
+from typing import Any, Tuple, Union
+import time
+from game import Game
+from game_state import GameState
+from endgame import EndgameTable
+from move_ordering import MoveOrdering
+from strategy import SearchCancelled, bounded_state_value
+from transposition import TranspositionTable
+
+# the share of a move's budget used when a win in one move is available
+WIN_IN_ONE_SHARE = 0.1
+
+
+class TimeController:
+    """
+    A game clock that hands out a time budget for each move.
+
+    The budget of a move is an even share of the clock over the moves the
+    player still has to make, scaled by the complexity of the position, plus
+    the increment. A search may stop after its soft limit if its best move
+    is stable, and must stop at its hard limit, which leaves a reserve on
+    the clock. Time saved on simple positions goes to the later moves.
+
+    === Attributes ===
+    remaining - the seconds left on the clock
+    increment - the seconds added to the clock after each move
+    reserve - the fraction of the clock never handed out to a single move
+    """
+    remaining: float
+    increment: float
+    reserve: float
+
+    def __init__(self, total_time: float, increment: float = 0.0,
+                 reserve: float = 0.25) -> None:
+        """
+        Initialize a TimeController with total_time seconds on the clock.
+        """
+
+        self.remaining = total_time
+        self.increment = increment
+        self.reserve = reserve
+
+    def budget(self, state: GameState) -> Tuple[float, float]:
+        """
+        Return the (soft limit, hard limit) in seconds for the search of the
+        move from state.
+
+        >>> from stonehenge import StonehengeState
+        >>> clock = TimeController(60, 1)
+        >>> clock.budget(StonehengeState(True, 2))
+        (16.0, 45.0)
+        """
+
+        # the players take turns, so we make about half the moves left
+        moves_left = len(state.get_possible_moves())
+        our_moves = max(1, (moves_left + 1) // 2)
+        soft_limit = (self.remaining / our_moves * self.complexity(state)
+                      + self.increment)
+        hard_limit = max(0.0, min(3 * soft_limit,
+                                  (1 - self.reserve) * self.remaining))
+        return min(soft_limit, hard_limit), hard_limit
+
+    def complexity(self, state: GameState) -> float:
+        """
+        Return the share of an even budget that the search of the move from
+        state deserves, between 0 and 1. Moves equivalent to others (e.g.
+        dead cells) are skipped by the search, so the share is the fraction
+        of the moves it has to try, or WIN_IN_ONE_SHARE if a move wins at
+        once.
+
+        >>> from stonehenge import StonehengeState
+        >>> clock = TimeController(60)
+        >>> clock.complexity(StonehengeState(True, 2))
+        1.0
+        >>> clock.complexity(StonehengeState(True, 1))
+        0.1
+        """
+
+        moves = state.get_possible_moves()
+        if not moves:
+            return 1.0
+        if state.rough_outcome() == GameState.WIN:
+            return WIN_IN_ONE_SHARE
+        return len(state.get_search_moves()) / len(moves)
+
+    def record(self, elapsed: float) -> None:
+        """
+        Take elapsed seconds off the clock for a move and add the increment.
+        """
+
+        self.remaining = self.remaining - elapsed + self.increment
+
+
+class TimedStrategy:
+    """
+    A strategy that deepens an alpha-beta search until its TimeController
+    says to stop. The search stops early once the result is proven, or once
+    the best move has not changed for a few depths after half the soft
+    limit. It goes on up to the hard limit while the best move keeps
+    changing.
+
+    === Attributes ===
+    clock - the TimeController of the player using this strategy
+    table - the transposition table shared by all the searches
+    stable_depths - the depths the best move must survive to be stable
+    endgame - the endgame table probed by the searches, or None
+    ordering - the move ordering learnt in the searches of the current game
+    """
+    clock: TimeController
+    table: TranspositionTable
+    stable_depths: int
+    endgame: Union[EndgameTable, None]
+    ordering: MoveOrdering
+    _game: Union[Game, None]
+
+    def __init__(self, clock: TimeController, size_mb: float = 64,
+                 stable_depths: int = 2, endgame: EndgameTable = None) -> None:
+        """
+        Initialize a TimedStrategy using clock and a transposition table of
+        size_mb megabytes, probing endgame if it is given.
+        """
+
+        self.clock = clock
+        self.table = TranspositionTable(size_mb)
+        self.stable_depths = stable_depths
+        self.endgame = endgame
+        self.ordering = MoveOrdering()
+        self._game = None
+
+    def __call__(self, game: Game) -> Any:
+        """
+        Return the best move found for game within the time budget.
+        """
+
+        start = time.monotonic()
+        # what was learnt about move ordering only applies to the same game
+        if game is not self._game:
+            self.ordering.clear()
+            self._game = game
+        self.ordering.age()
+        state = game.current_state
+        moves = state.get_possible_moves()
+        soft_limit, hard_limit = self.clock.budget(state)
+        deadline = start + hard_limit
+
+        best_move = moves[0] if moves else None
+        stable = 0
+        depth = 1
+        while moves and depth <= len(moves):
+            try:
+                move, score = self._search_root(game, moves, best_move,
+                                                depth, deadline)
+            except SearchCancelled:
+                break
+            stable = stable + 1 if move == best_move else 0
+            best_move = move
+            elapsed = time.monotonic() - start
+            # a proven result cannot change with more search
+            if abs(score) == GameState.WIN:
+                break
+            if elapsed > soft_limit:
+                # keep going while the best move is still changing
+                if stable >= self.stable_depths:
+                    break
+            elif stable >= self.stable_depths and elapsed > soft_limit / 2:
+                break
+            depth += 1
+
+        self.clock.record(time.monotonic() - start)
+        return best_move
+
+    def _search_root(self, game: Game, moves: list, best_move: Any,
+                     depth: int, deadline: float) -> Tuple[Any, float]:
+        """
+        Return the best of moves from game.current_state and its score,
+        searched to depth moves, trying best_move first.
+        """
+
+        ordered = [best_move] + [move for move in moves if move != best_move]
+        alpha = GameState.LOSE - 1
+        result = (best_move, alpha)
+        for move in ordered:
+            new_state = game.current_state.make_move(move)
+            # multiply by -1 because of the game's zero-sum rule.
+            score = -1 * bounded_state_value(game, new_state, depth - 1,
+                                             GameState.LOSE - 1, -alpha,
+                                             self.table, deadline,
+                                             self.endgame, self.ordering)
+            if score > alpha:
+                alpha = score
+                result = (move, score)
+            if alpha == GameState.WIN:
+                break
+        return result
@@ -0,0 +1,163 @@
+"""
+A fixed-capacity transposition table for caching searched game states.
+"""
+from array import array
+from typing import Any, List, Tuple, Union
+
+# bound types of a stored value
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# bytes taken by one entry: key, value, depth, bound and a move reference
+ENTRY_BYTES = (array('q').itemsize + array('d').itemsize
+               + array('h').itemsize + array('b').itemsize + 8)
+
+
+class TranspositionTable:
+    """
+    A transposition table whose memory footprint is fixed when it is created.
+
+    Entries are kept in preallocated arrays and grouped in buckets of two
+    slots: the first slot keeps the entry searched to the greatest depth and
+    the second slot is always replaced.
+
+    === Attributes ===
+    size_mb - the memory the table was configured with, in megabytes
+    num_buckets - the number of buckets of the table
+    used - the number of slots holding an entry
+    collisions - the number of entries overwritten by a different key
+    """
+    size_mb: float
+    num_buckets: int
+    used: int
+    collisions: int
+    _keys: array
+    _values: array
+    _depths: array
+    _bounds: array
+    _moves: List[Any]
+
+    def __init__(self, size_mb: float = 16) -> None:
+        """
+        Initialize an empty TranspositionTable taking about size_mb
+        megabytes.
+
+        >>> table = TranspositionTable(1)
+        >>> table.num_buckets
+        19418
+        >>> table.fill_rate()
+        0.0
+        """
+
+        self.size_mb = size_mb
+        self.num_buckets = max(1, int(size_mb * 1024 * 1024)
+                               // (2 * ENTRY_BYTES))
+        slots = 2 * self.num_buckets
+        self._keys = array('q', [0]) * slots
+        self._values = array('d', [0.0]) * slots
+        # a depth of -1 marks an empty slot
+        self._depths = array('h', [-1]) * slots
+        self._bounds = array('b', [EXACT]) * slots
+        self._moves = [None] * slots
+        self.used = 0
+        self.collisions = 0
+
+    def probe(self, key: Any) -> Union[Tuple[float, int, int, Any], None]:
+        """
+        Return the (value, depth, bound, best move) stored for key, or None
+        if key is not in this TranspositionTable.
+
+        >>> table = TranspositionTable(1)
+        >>> table.store('A', 1, 3, EXACT, 'B')
+        >>> table.probe('A')
+        (1.0, 3, 0, 'B')
+        >>> table.probe('B') is None
+        True
+        """
+
+        hashed = hash(key)
+        slot = self._bucket(hashed)
+        for i in (slot, slot + 1):
+            if self._depths[i] >= 0 and self._keys[i] == hashed:
+                return (self._values[i], self._depths[i], self._bounds[i],
+                        self._moves[i])
+        return None
+
+    def store(self, key: Any, value: float, depth: int, bound: int,
+              move: Any = None) -> None:
+        """
+        Store value, searched to depth with bound type bound, and the best
+        move found for key.
+
+        >>> table = TranspositionTable(0)
+        >>> table.store('A', 1, 5, EXACT)
+        >>> table.store('B', -1, 2, EXACT)
+        >>> table.store('C', 0, 1, EXACT)
+        >>> table.probe('A'), table.probe('B'), table.probe('C')
+        ((1.0, 5, 0, None), None, (0.0, 1, 0, None))
+        >>> table.collisions
+        1
+        """
+
+        hashed = hash(key)
+        slot = self._bucket(hashed)
+        # replace the deepest entry only with the same key or a deeper search
+        if (self._depths[slot] < 0 or self._keys[slot] == hashed
+                or depth >= self._depths[slot]):
+            i = slot
+        else:
+            i = slot + 1
+        if self._depths[i] < 0:
+            self.used += 1
+        elif self._keys[i] != hashed:
+            self.collisions += 1
+        self._keys[i] = hashed
+        self._values[i] = value
+        self._depths[i] = depth
+        self._bounds[i] = bound
+        self._moves[i] = move
+
+    def discard_deeper(self, depth: int) -> None:
+        """
+        Remove every entry searched to more than depth moves.
+
+        >>> table = TranspositionTable(1)
+        >>> table.store('A', 1, 5, EXACT)
+        >>> table.store('B', -1, 2, EXACT)
+        >>> table.discard_deeper(4)
+        >>> table.probe('A'), table.probe('B')
+        (None, (-1.0, 2, 0, None))
+        """
+
+        for i in range(2 * self.num_buckets):
+            if self._depths[i] > depth:
+                self._depths[i] = -1
+                self._moves[i] = None
+                self.used -= 1
+
+    def fill_rate(self) -> float:
+        """
+        Return the fraction of the slots of this TranspositionTable holding
+        an entry.
+        """
+
+        return self.used / (2 * self.num_buckets)
+
+    def clear(self) -> None:
+        """
+        Remove every entry from this TranspositionTable.
+        """
+
+        for i in range(2 * self.num_buckets):
+            self._depths[i] = -1
+            self._moves[i] = None
+        self.used = 0
+        self.collisions = 0
+
+    def _bucket(self, hashed: int) -> int:
+        """
+        Return the index of the first slot of the bucket for hashed.
+        """
+
+        return (hashed % self.num_buckets) * 2